@@ -9,23 +9,49 @@ This script:
 - Fetches quotes via a stubbed fetch_quotes() (replace with real API call later).
 - For each scheduled run date (every 7 days), reports whether a matching quote
   meets budget and contains all requested features.
+- Parses the quote list incrementally while the response streams in when ijson
+  is installed.
+- When the request sets "per_date_quotes": true, sends each run date to the API
+  and fetches all dates concurrently.
+
+The module is fully annotated and type-checks under mypy, so batch users can
+compile it ahead of time with `mypyc schedule_run.py` and import the built module.
 """
 
 from __future__ import annotations
 
+import asyncio
 import datetime as dt
+import functools
 import json
 import os
 import re
 import sys
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple, Type
 
 import httpx
 
+try:
+    import ahocorasick  # type: ignore[import-not-found]
+except ImportError:  # pyahocorasick is optional; fall back to the compiled regex.
+    ahocorasick = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib json module.
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import ijson  # type: ignore[import-untyped]
+except ImportError:  # ijson is optional; without it responses are parsed in one go.
+    ijson = None
+
 
 # Lightweight alias map to normalize feature names after extraction.
-ALIAS_MAP = {
+ALIAS_MAP: Dict[str, str] = {
     "windshield": "windshield_cover",
     "windscreen": "windshield_cover",
     "windshield cover": "windshield_cover",
@@ -45,20 +71,137 @@ ALIAS_MAP = {
     "european_cover": "european_cover",
     "europe": "european_cover",
 }
+# Canonical feature names are interned so that features parsed from the API (see
+# normalize_feature_name) are the same objects, letting set lookups match on identity.
+ALIAS_MAP = {alias: sys.intern(normalized) for alias, normalized in ALIAS_MAP.items()}
+
+# First number in the preference text is taken as the budget.
+_NUM_RE = re.compile(r"\d+(?:\.\d+)?")
+
+# (alias, normalized) pairs, longest alias first, so "windshield cover" wins over
+# "windshield" wherever both match at the same position.
+_ALIASES_SORTED = sorted(ALIAS_MAP.items(), key=lambda kv: -len(kv[0]))
+
+# Single alternation over every alias, compiled once; the regex tries alternatives in
+# order, so the longest-first ordering gives longest-match-wins.
+_ALIAS_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(alias) for alias, _ in _ALIASES_SORTED) + r")\b"
+)
+
+# Aho-Corasick automaton over the same aliases: one linear scan of the text no
+# matter how many aliases there are. Values carry the alias length so the start
+# of each hit can be recovered for the word-boundary check.
+_ALIAS_AUTOMATON: Any = None
+if ahocorasick is not None:
+    _ALIAS_AUTOMATON = ahocorasick.Automaton()
+    for _alias, _normalized in _ALIASES_SORTED:
+        _ALIAS_AUTOMATON.add_word(_alias, (len(_alias), _normalized))
+    _ALIAS_AUTOMATON.make_automaton()
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def _scan_aliases(user_preferences: str) -> Tuple[str, ...]:
+    """
+    Return normalized features for every alias found as a whole word, in first-seen order.
+    """
+    # Insertion-ordered dict as an O(1) dedupe that keeps the first-seen order.
+    seen: Dict[str, None] = {}
+    # Match against lowercased text rather than with IGNORECASE: Unicode case folding
+    # can match characters (e.g. "ſ") that don't lower back to an ALIAS_MAP key.
+    lower_text = user_preferences.lower()
+    if _ALIAS_AUTOMATON is None:
+        for m in _ALIAS_RE.finditer(lower_text):
+            seen[ALIAS_MAP[m.group(0)]] = None
+        return tuple(seen)
+
+    last = len(lower_text) - 1
+    # (start, normalized) of accepted hits, ordered by start.
+    hits: List[Tuple[int, str]] = []
+    for end, (length, normalized) in _ALIAS_AUTOMATON.iter(lower_text):
+        start = end - length + 1
+        # Mirror the regex's \b on both sides of the alias.
+        if start > 0 and _is_word_char(lower_text[start - 1]):
+            continue
+        if end < last and _is_word_char(lower_text[end + 1]):
+            continue
+        # Hits arrive by end position, so a longer alias covering earlier hits shows up
+        # after them; drop those to keep longest-match-wins like the regex.
+        while hits and hits[-1][0] >= start:
+            hits.pop()
+        hits.append((start, normalized))
+    for _, normalized in hits:
+        seen[normalized] = None
+    return tuple(seen)
+
+
+# Placeholders for fields the API requires but a request may omit.
+_INSURANCE_DEFAULTS = MappingProxyType(
+    {
+        "current_insurance_provider": "Unknown",
+        "policy_id": "UNKNOWN",
+        "policy_type": "car",
+        "policy_start_date": None,
+        "policy_end_date": None,
+    }
+)
+
+_JSON_HEADERS = {"content-type": "application/json"}
+
+# UTF-8 byte order mark; API response bodies may start with one.
+_UTF8_BOM = b"\xef\xbb\xbf"
 
+# Malformed-shape errors, raised identically by the stream and non-stream parsers.
+_NOT_AN_OBJECT = "response body is not a JSON object"
+_QUOTES_NOT_A_LIST = "quotes_with_insights is not a list"
 
-@dataclass
+# Failures while fetching or decoding a response, reported as RuntimeError on every
+# fetch path. ValueError covers json/orjson decode errors; ijson's JSONError does not
+# derive from it.
+_FETCH_ERRORS: Tuple[Type[BaseException], ...] = (
+    (httpx.HTTPError, ValueError) if ijson is None else (httpx.HTTPError, ValueError, ijson.JSONError)
+)
+
+# Upper bound on in-flight requests when fetching quotes for several dates at once.
+MAX_CONCURRENT_FETCHES = 8
+
+# Fetched quotes are reused for identical payloads for at most this many seconds.
+QUOTE_CACHE_TTL_SECONDS = 300
+
+# Shared HTTP client so repeated calls reuse pooled keep-alive connections.
+_HTTP_CLIENT: Optional[httpx.Client] = None
+
+
+def _get_client() -> httpx.Client:
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None:
+        _HTTP_CLIENT = httpx.Client(
+            timeout=60.0,
+            limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=30),
+        )
+    return _HTTP_CLIENT
+
+
+@dataclass(slots=True, frozen=True)
 class ExtractedPreferences:
     budget: Optional[float]
-    features: List[str]
+    features: Tuple[str, ...]
     raw_text: str
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Quote:
     insurer: str
     price: float
-    features: List[str]
+    features: Tuple[str, ...]
+    # Hashed view of `features` for O(1) membership checks when filtering; always
+    # derived from `features` so the two cannot disagree.
+    feature_set: FrozenSet[str] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "feature_set", frozenset(self.features))
 
 
 def call_llm_to_extract_preferences(user_preferences: str) -> ExtractedPreferences:
@@ -70,104 +213,260 @@ def call_llm_to_extract_preferences(user_preferences: str) -> ExtractedPreferenc
     {"budget": number|null, "features": [strings]} for production.
     """
     budget = None
-    number_match = re.search(r"([0-9]+(?:\\.[0-9]+)?)", user_preferences.replace(",", ""))
+    text = user_preferences.replace(",", "") if "," in user_preferences else user_preferences
+    number_match = _NUM_RE.search(text)
     if number_match:
         try:
-            budget = float(number_match.group(1))
+            budget = float(number_match.group(0))
         except ValueError:
             budget = None
 
-    lower_text = user_preferences.lower()
-    normalized_features: List[str] = []
-
     # Scan for known aliases/typos as whole words to reduce false positives.
-    for alias, normalized in ALIAS_MAP.items():
-        pattern = r"\\b" + re.escape(alias) + r"\\b"
-        if re.search(pattern, lower_text):
-            if normalized not in normalized_features:
-                normalized_features.append(normalized)
+    normalized_features = _scan_aliases(user_preferences)
 
     return ExtractedPreferences(budget=budget, features=normalized_features, raw_text=user_preferences)
 
 
+@functools.lru_cache(maxsize=512)
 def normalize_feature_name(feature: str) -> str:
     """
     Normalize feature keys from the API (e.g., legal_cover_included -> legal_cover).
+    Cached because the API repeats the same small vocabulary across every quote.
     """
     f = feature.lower().strip()
     if f.endswith("_included"):
         f = f[: -len("_included")]
-    return f
+    return sys.intern(f)
 
 
 def ensure_insurance_fields(insurance_details: Dict) -> Dict:
     """
     Ensure required fields exist for the API; fill minimal placeholders if missing.
     """
-    defaults = {
-        "current_insurance_provider": "Unknown",
-        "policy_id": "UNKNOWN",
-        "policy_type": "car",
-        "policy_start_date": None,
-        "policy_end_date": None,
-    }
-    result = {**defaults, **insurance_details}
+    result = insurance_details.copy()
+    for key, value in _INSURANCE_DEFAULTS.items():
+        result.setdefault(key, value)
     return result
 
 
-def fetch_quotes(insurance_details: Dict, user_preferences: str) -> List[Quote]:
+def _dumps_canonical(obj: Dict) -> bytes:
     """
-    Call the Alfie intelligent API (local service) and map the response to Quote objects.
+    Serialize to compact JSON bytes with sorted keys, so equal payloads give equal bytes.
     """
-    api_url = os.getenv("ALFIE_API_URL", "http://localhost:8080/complete-analysis")
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def _loads(raw: bytes) -> Any:
+    if orjson is None:
+        return json.loads(raw)
+    # json.loads on bytes accepts a leading BOM and orjson does not; strip it to match.
+    return orjson.loads(raw[len(_UTF8_BOM):] if raw.startswith(_UTF8_BOM) else raw)
+
+
+def _api_url() -> str:
+    return os.getenv("ALFIE_API_URL", "http://localhost:8080/complete-analysis")
+
+
+def build_payload(insurance_details: Dict, user_preferences: str, run_date: Optional[dt.date] = None) -> Dict:
     payload = {
         "insurance_details": ensure_insurance_fields(insurance_details),
         "user_preferences": user_preferences,
         "conversation_history": [],
     }
+    if run_date is not None:
+        payload["run_date"] = run_date.isoformat()
+    return payload
+
+
+def fetch_quotes(insurance_details: Dict, user_preferences: str) -> List[Quote]:
+    """
+    Call the Alfie intelligent API (local service) and map the response to Quote objects.
+    Results are memoized in-process per payload for up to QUOTE_CACHE_TTL_SECONDS.
+    """
+    payload = build_payload(insurance_details, user_preferences)
+    # Canonical JSON doubles as the cache key; the time bucket expires entries so a
+    # long-lived importer doesn't keep serving stale prices.
+    ttl_bucket = int(time.monotonic() // QUOTE_CACHE_TTL_SECONDS)
+    return list(_fetch_quotes_cached(_api_url(), _dumps_canonical(payload), ttl_bucket))
 
+
+@functools.lru_cache(maxsize=32)
+def _fetch_quotes_cached(api_url: str, body: bytes, ttl_bucket: int) -> Tuple[Quote, ...]:
+    """
+    POST `body` to the API and parse the quotes. HTTP failures and undecodable or
+    malformed response bodies raise RuntimeError, whether or not ijson is installed.
+    """
     try:
-        with httpx.Client(timeout=60.0) as client:
-            resp = client.post(api_url, json=payload)
+        if ijson is None:
+            resp = _get_client().post(api_url, content=body, headers=_JSON_HEADERS)
             resp.raise_for_status()
-            data = resp.json()
-    except httpx.HTTPError as exc:
+            quotes = parse_quotes(_loads(resp.content))
+        else:
+            with _get_client().stream("POST", api_url, content=body, headers=_JSON_HEADERS) as resp:
+                resp.raise_for_status()
+                quotes = _stream_quotes(resp)
+    except _FETCH_ERRORS as exc:
         raise RuntimeError(f"Failed to fetch quotes from {api_url}: {exc}") from exc
 
+    return tuple(quotes)
+
+
+def _stream_quotes(resp: httpx.Response) -> List[Quote]:
+    """
+    Build Quote objects from quotes_with_insights as body chunks arrive, without
+    materializing the whole response.
+    """
+    # Walk the raw event stream rather than items_coro so the response shape can be
+    # checked the same way parse_quotes checks it; each quote is assembled with an
+    # ObjectBuilder as its events arrive.
+    events = ijson.sendable_list()
+    parser = ijson.parse_coro(events, use_float=True)
+    quotes: List[Quote] = []
+    item_prefix = "quotes_with_insights.item"
+    builder: Any = None
+    seen_root = False
+
+    def add(raw: Any) -> None:
+        quote = parse_quote(raw)
+        if quote is not None:
+            quotes.append(quote)
+
+    def drain() -> None:
+        nonlocal builder, seen_root
+        for prefix, event, value in events:
+            if not seen_root:
+                if event != "start_map":
+                    raise ValueError(_NOT_AN_OBJECT)
+                seen_root = True
+            if builder is not None:
+                builder.event(event, value)
+                if prefix == item_prefix and event in ("end_map", "end_array"):
+                    add(builder.value)
+                    builder = None
+            elif prefix == item_prefix:
+                if event in ("start_map", "start_array"):
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+                else:
+                    add(value)
+            elif prefix == "quotes_with_insights" and event not in ("start_array", "end_array"):
+                raise ValueError(_QUOTES_NOT_A_LIST)
+        del events[:]
+
+    # resp.json() accepts a leading BOM and ijson does not, so buffer the opening bytes
+    # until a BOM can be recognized and strip it to match.
+    head: Optional[bytes] = b""
+    for chunk in resp.iter_bytes():
+        if head is not None:
+            head += chunk
+            if len(head) < len(_UTF8_BOM):
+                continue
+            chunk = head[len(_UTF8_BOM):] if head.startswith(_UTF8_BOM) else head
+            head = None
+            if not chunk:
+                # ijson treats an empty send as end of input.
+                continue
+        parser.send(chunk)
+        drain()
+    if head:
+        parser.send(head)
+    parser.close()
+    drain()
+    return quotes
+
+
+async def _fetch_quotes_for_dates(
+    insurance_details: Dict, user_preferences: str, run_dates: List[dt.date]
+) -> List[List[Quote]]:
+    api_url = _api_url()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+
+    async with httpx.AsyncClient(
+        timeout=60.0, limits=httpx.Limits(max_connections=MAX_CONCURRENT_FETCHES)
+    ) as client:
+
+        async def fetch_one(run_date: dt.date) -> List[Quote]:
+            body = _dumps_canonical(build_payload(insurance_details, user_preferences, run_date))
+            async with semaphore:
+                resp = await client.post(api_url, content=body, headers=_JSON_HEADERS)
+            resp.raise_for_status()
+            return parse_quotes(_loads(resp.content))
+
+        try:
+            return list(await asyncio.gather(*(fetch_one(d) for d in run_dates)))
+        except _FETCH_ERRORS as exc:
+            raise RuntimeError(f"Failed to fetch quotes from {api_url}: {exc}") from exc
+
+
+def fetch_quotes_for_dates(
+    insurance_details: Dict, user_preferences: str, run_dates: List[dt.date]
+) -> List[List[Quote]]:
+    """
+    Fetch date-specific quotes for every run date concurrently, in run_dates order.
+    HTTP failures and undecodable or malformed response bodies raise RuntimeError.
+    """
+    return asyncio.run(_fetch_quotes_for_dates(insurance_details, user_preferences, run_dates))
+
+
+def parse_quotes(data: Dict) -> List[Quote]:
+    """
+    Map a /complete-analysis response body to Quote objects, skipping unpriced quotes.
+    Raises ValueError if the body is not an object or quotes_with_insights is not a list.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(_NOT_AN_OBJECT)
     quotes_raw = data.get("quotes_with_insights", [])
+    if not isinstance(quotes_raw, list):
+        raise ValueError(_QUOTES_NOT_A_LIST)
+
     quotes: List[Quote] = []
     for q in quotes_raw:
-        insurer = q.get("insurer_name") or q.get("original_quote", {}).get("output", {}).get("insurer_name", "Unknown")
-        price = (
-            q.get("price_analysis", {}).get("quote_price")
-            or q.get("original_quote", {}).get("output", {}).get("policy_cost")
-        )
-        available_features = q.get("available_features", [])
-        normalized = [normalize_feature_name(f) for f in available_features]
+        quote = parse_quote(q)
+        if quote is not None:
+            quotes.append(quote)
 
-        if price is None:
-            continue
+    return quotes
 
-        quotes.append(Quote(insurer=insurer, price=float(price), features=normalized))
 
-    return quotes
+def parse_quote(q: Dict) -> Optional[Quote]:
+    """
+    Map one quotes_with_insights entry to a Quote, or None if it has no price.
+    """
+    insurer = q.get("insurer_name") or q.get("original_quote", {}).get("output", {}).get("insurer_name", "Unknown")
+    price = (
+        q.get("price_analysis", {}).get("quote_price")
+        or q.get("original_quote", {}).get("output", {}).get("policy_cost")
+    )
+    available_features = q.get("available_features", [])
+    normalized = tuple(normalize_feature_name(f) for f in available_features)
+
+    if price is None:
+        return None
 
+    return Quote(insurer=insurer, price=float(price), features=normalized)
 
-def matches_requirements(quote: Quote, budget: Optional[float], required_features: List[str]) -> bool:
+
+def matches_requirements(quote: Quote, budget: Optional[float], required_features: FrozenSet[str]) -> bool:
     if budget is not None and quote.price > budget:
         return False
-    if required_features:
-        missing = [f for f in required_features if f not in quote.features]
-        if missing:
-            return False
+    if not required_features.issubset(quote.feature_set):
+        return False
     return True
 
 
-def find_best_match(quotes: List[Quote], budget: Optional[float], required_features: List[str]) -> Optional[Quote]:
-    candidates = [q for q in quotes if matches_requirements(q, budget, required_features)]
-    if not candidates:
-        return None
-    return min(candidates, key=lambda q: q.price)
+def find_best_match(
+    quotes: List[Quote], budget: Optional[float], required_features: FrozenSet[str]
+) -> Optional[Quote]:
+    # Filter and pick the cheapest in the same pass.
+    best: Optional[Quote] = None
+    for q in quotes:
+        if not matches_requirements(q, budget, required_features):
+            continue
+        if best is None or q.price < best.price:
+            best = q
+    return best
 
 
 def parse_date(date_str: str) -> dt.date:
@@ -175,8 +474,9 @@ def parse_date(date_str: str) -> dt.date:
 
 
 def load_request(path: str) -> Dict:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with open(path, "rb") as f:
+        data: Dict = _loads(f.read())
+    return data
 
 
 def run_schedule(request_path: str) -> None:
@@ -185,35 +485,52 @@ def run_schedule(request_path: str) -> None:
     user_pref_text = data.get("user_preferences", "")
     iterations = int(data.get("iterations", 10))
     start_date_str = data.get("start_date", "2025-11-23")
+    per_date_quotes = bool(data.get("per_date_quotes", False))
 
     prefs = call_llm_to_extract_preferences(user_pref_text)
-    required_features = prefs.features
+    required_features = frozenset(prefs.features)
     budget = prefs.budget
 
     start_date = parse_date(start_date_str)
     interval_days = 7
+    run_dates = [start_date + dt.timedelta(days=i * interval_days) for i in range(iterations)]
+
+    if not run_dates:
+        quotes_by_date = []
+    elif per_date_quotes:
+        quotes_by_date = fetch_quotes_for_dates(insurance_details, user_pref_text, run_dates)
+    else:
+        # The payload does not depend on the run date, so one fetch serves every iteration.
+        quotes_by_date = [fetch_quotes(insurance_details, user_pref_text)] * iterations
+
+    # Budget and features are fixed for the whole schedule, so both messages are chosen once.
+    if budget is not None:
+        success_fmt = (
+            "date: {d}, match_found: yes, message: found {ins} quote for £{p:.2f}, below budget £{b:.2f} "
+            "with all requested features\n"
+        )
+    else:
+        success_fmt = "date: {d}, match_found: yes, message: found {ins} quote for £{p:.2f} with requested features\n"
 
-    for i in range(iterations):
-        run_date = start_date + dt.timedelta(days=i * interval_days)
-        quotes = fetch_quotes(insurance_details, user_pref_text)
+    reason = []
+    if budget is not None:
+        reason.append("no quote within budget")
+    if required_features:
+        reason.append("missing required features")
+    reason_text = " and ".join(reason) if reason else "no quotes available"
+    failure_fmt = "date: {d}, match_found: no, message: " + reason_text + "\n"
+
+    lines: List[str] = []
+    for run_date, quotes in zip(run_dates, quotes_by_date):
         match = find_best_match(quotes, budget, required_features)
 
         if match:
-            message = (
-                f"found {match.insurer} quote for £{match.price:.2f}, below budget £{budget:.2f} "
-                f"with all requested features"
-                if budget is not None
-                else f"found {match.insurer} quote for £{match.price:.2f} with requested features"
-            )
-            print(f"date: {run_date.isoformat()}, match_found: yes, message: {message}")
+            lines.append(success_fmt.format(d=run_date.isoformat(), ins=match.insurer, p=match.price, b=budget))
         else:
-            reason = []
-            if budget is not None:
-                reason.append("no quote within budget")
-            if required_features:
-                reason.append("missing required features")
-            reason_text = " and ".join(reason) if reason else "no quotes available"
-            print(f"date: {run_date.isoformat()}, match_found: no, message: {reason_text}")
+            lines.append(failure_fmt.format(d=run_date.isoformat()))
+
+    sys.stdout.write("".join(lines))
+    sys.stdout.flush()
 
 
 if __name__ == "__main__":